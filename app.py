@@ -1,13 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, current_app, request, jsonify
 from flask_cors import CORS
-import requests
-from bs4 import BeautifulSoup
 import logging
 import time
 import random
+import hashlib
+import os
+import gzip
+import json
+import threading
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
+from compare_cache import CompareCache
+from history import HistoryStore, RescrapeScheduler, DEFAULT_INTERVAL
+
+# requests and bs4 are imported lazily (see get_session/scrape_page) so that
+# importing this module stays cheap; warm_up() loads them ahead of time.
+api = Blueprint('api', __name__)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -82,6 +89,33 @@ FLIPKART_SELECTORS = {
     ]
 }
 
+# Hosts whose connections are opened by warm_up(preconnect=True)
+WARM_UP_HOSTS = [
+    host.strip() for host in
+    os.environ.get('WARM_UP_HOSTS', 'https://www.amazon.in,https://www.flipkart.com').split(',')
+    if host.strip()
+]
+
+_session = None
+_session_pid = None
+
+def get_session():
+    """Per-process shared session so connections to origins are pooled and reused"""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        import http.cookiejar
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        # The session is shared by every scrape in the worker, so it must not
+        # carry one site's session/anti-bot cookies into unrelated requests
+        session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session, _session_pid = session, os.getpid()
+    return _session
+
 def is_valid_url(url):
     return url.startswith(('http://', 'https://'))
 
@@ -205,18 +239,26 @@ def extract_flipkart_features(soup, url):
     logger.info(f"Flipkart features extracted: {list(features.keys())}")
     return features
 
-def scrape_features(url):
+def scrape_page(url, unchanged_hash=None):
+    """Scrape a URL, returning (features, content_hash of the raw page).
+
+    When the page hashes to unchanged_hash, parsing is skipped and features is None.
+    """
+    import requests
+    import bs4
     try:
         logger.info(f"Scraping: {url}")
         
         # Add small random delay to appear more human-like
         time.sleep(random.uniform(0.5, 1.5))
         
-        session = requests.Session()
-        response = session.get(url, headers=get_headers(), timeout=20, allow_redirects=True)
+        response = get_session().get(url, headers=get_headers(), timeout=20, allow_redirects=True)
         response.raise_for_status()
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        if content_hash == unchanged_hash:
+            return None, content_hash
         
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = bs4.BeautifulSoup(response.content, 'html.parser')
 
         features = {}
         
@@ -249,7 +291,6 @@ def scrape_features(url):
 
             # Try to extract feature lists
             if not features.get('Features'):
-                import bs4
                 for ul in soup.find_all(['ul', 'ol'])[:5]:
                     if isinstance(ul, bs4.element.Tag):
                         items = [li.get_text(strip=True) for li in ul.find_all('li')[:8]]
@@ -267,24 +308,33 @@ def scrape_features(url):
             }
 
         logger.info(f"Successfully scraped {len(features)} features from {url}")
-        return features
+        return features, content_hash
 
     except requests.Timeout:
         logger.error(f"Timeout error for {url}")
-        return {'error': f'Request timeout. The website took too long to respond.'}
+        return {'error': f'Request timeout. The website took too long to respond.'}, None
     except requests.HTTPError as e:
         logger.error(f"HTTP error for {url}: {e}")
         if e.response.status_code == 403:
-            return {'error': 'Access denied by website (403). The site is blocking automated requests.'}
+            return {'error': 'Access denied by website (403). The site is blocking automated requests.'}, None
         elif e.response.status_code == 503:
-            return {'error': 'Service unavailable (503). The website is temporarily down or blocking requests.'}
-        return {'error': f'HTTP error {e.response.status_code}: {str(e)}'}
+            return {'error': 'Service unavailable (503). The website is temporarily down or blocking requests.'}, None
+        return {'error': f'HTTP error {e.response.status_code}: {str(e)}'}, None
     except requests.RequestException as e:
         logger.error(f"Request error for {url}: {e}")
-        return {'error': f'Failed to fetch the page. Error: {str(e)[:100]}'}
+        return {'error': f'Failed to fetch the page. Error: {str(e)[:100]}'}, None
     except Exception as e:
         logger.error(f"Scraping error for {url}: {e}")
-        return {'error': f'Error processing the page. This website may require special handling.'}
+        return {'error': f'Error processing the page. This website may require special handling.'}, None
+
+def scrape_features(url):
+    return scrape_page(url)[0]
+
+def scrape_normalized(url, unchanged_hash=None):
+    features, content_hash = scrape_page(url, unchanged_hash)
+    if features is None or 'error' in features:
+        return features, content_hash
+    return normalize_features(features), content_hash
 
 def normalize_features(raw_data):
     """Normalize scraped data into consistent format"""
@@ -299,11 +349,141 @@ def normalize_features(raw_data):
         'Price': raw_data.get('Price') or 'Price not found'
     }
 
-@app.route('/compare', methods=['POST'])
+# Comparison results are reused for this long before the origins are scraped again
+COMPARE_CACHE_TTL = int(os.environ.get('COMPARE_CACHE_TTL', 600))
+GZIP_MIN_SIZE = 1024
+
+# The cache lives in a SQLite file so every gunicorn worker sees the same
+# entries and can answer a revalidation with 304 without scraping.
+def cache_get(key):
+    return current_app.extensions['compare_cache'].get(*key, ttl=COMPARE_CACHE_TTL)
+
+def cache_put(key, payload):
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    body = current_app.json.dumps(payload).encode('utf-8')
+    entry = {
+        'body': body,
+        'gzipped': gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_SIZE else None,
+        'etag': hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32],
+        'created': time.time(),
+    }
+    if COMPARE_CACHE_TTL > 0:
+        try:
+            current_app.extensions['compare_cache'].put(*key, entry, ttl=COMPARE_CACHE_TTL)
+        except Exception as e:
+            logger.error(f"Failed to cache comparison: {e}")
+    return entry
+
+def cached_json_response(entry):
+    """Build a response with validators, freshness and optional gzip from a cache entry"""
+    max_age = max(0, int(COMPARE_CACHE_TTL - (time.time() - entry['created'])))
+    gzip_ok = entry['gzipped'] is not None and request.accept_encodings['gzip'] > 0
+    # Each encoding is a distinct representation, so it gets its own strong ETag
+    etag = entry['etag'] + '-gz' if gzip_ok else entry['etag']
+
+    # If-None-Match uses weak comparison (RFC 9110), so W/ tags from re-encoding proxies match too
+    if request.if_none_match.contains_weak(entry['etag']) or request.if_none_match.contains_weak(entry['etag'] + '-gz'):
+        response = current_app.response_class(status=304)
+    elif gzip_ok:
+        response = current_app.response_class(entry['gzipped'], mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = current_app.response_class(entry['body'], mimetype='application/json')
+
+    response.set_etag(etag)
+    response.cache_control.max_age = max_age
+    response.cache_control.public = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+def warm_up(preconnect=False):
+    """Pay one-off startup costs before serving traffic.
+
+    Imports the scraping stack, builds the HTML parser and compiles every
+    selector into soupsieve's cache. Run it before forking workers (e.g.
+    gunicorn --preload) so the result is shared copy-on-write. Open sockets
+    must not be shared across a fork, so preconnect is done per worker.
+    """
+    import bs4
+
+    started = time.time()
+    soup = bs4.BeautifulSoup('<html><body><h1>warm-up</h1><ul><li>x</li></ul></body></html>', 'html.parser')
+    selectors = PRICE_SELECTORS + DESC_SELECTORS
+    for site in (AMAZON_SELECTORS, FLIPKART_SELECTORS):
+        for group in site.values():
+            selectors.extend(group)
+    for selector in selectors:
+        try:
+            soup.select_one(selector)
+        except Exception as e:
+            logger.debug(f"Error with selector {selector}: {e}")
+    get_session()
+    logger.info(f"Warm-up compiled {len(selectors)} selectors in {time.time() - started:.2f}s")
+
+    if preconnect:
+        preconnect_hosts()
+
+_preconnected_pid = None
+
+def preconnect_worker():
+    """Open pooled connections to WARM_UP_HOSTS in this worker.
+
+    Called from the gunicorn post_fork hook (gunicorn.conf.py) so pools are
+    open before the worker accepts traffic.
+    """
+    global _preconnected_pid
+    _preconnected_pid = os.getpid()
+    preconnect_hosts()
+
+def preconnect_hosts(hosts=None):
+    session = get_session()
+    for host in hosts or WARM_UP_HOSTS:
+        try:
+            session.head(host, headers=get_headers(), timeout=5, allow_redirects=False)
+        except Exception as e:
+            logger.debug(f"Pre-connect to {host} failed: {e}")
+
+_process_services_lock = threading.Lock()
+
+def start_process_services():
+    """Start per-process background work on the first request in each worker.
+
+    Threads and sockets do not survive a fork, so this runs after gunicorn
+    has forked rather than when the app is created.
+    """
+    extensions = current_app.extensions
+    if extensions.get('process_services_pid') == os.getpid():
+        return
+    with _process_services_lock:
+        # Re-check under the lock: threaded workers can race on the first request
+        if extensions.get('process_services_pid') == os.getpid():
+            return
+        extensions['process_services_pid'] = os.getpid()
+
+    if os.environ.get('HISTORY_SCHEDULER', '1') != '0':
+        current_app.extensions['rescrape_scheduler'].start()
+    # Fallback for servers without the post_fork hook, e.g. the dev server
+    if current_app.config['PREWARM'] and _preconnected_pid != os.getpid():
+        threading.Thread(target=preconnect_hosts, name='preconnect', daemon=True).start()
+
+def get_history_store():
+    return current_app.extensions['history_store']
+
+@api.before_app_request
+def before_request():
+    start_process_services()
+
+@api.route('/compare', methods=['GET', 'POST'])
 def compare():
-    data = request.get_json()
-    if not data:
-        return jsonify({'error': 'Missing JSON payload'}), 400
+    # GET with query parameters is the cacheable form used by the frontend
+    if request.method == 'GET':
+        data = request.args
+        if not data:
+            return jsonify({'error': 'Missing url1 and url2 query parameters'}), 400
+    else:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'Missing JSON payload'}), 400
 
     url1, url2 = data.get('url1'), data.get('url2')
     if not (url1 and url2):
@@ -311,10 +491,14 @@ def compare():
     if not (is_valid_url(url1) and is_valid_url(url2)):
         return jsonify({'error': 'URLs must start with http:// or https://'}), 400
 
+    cached = cache_get((url1, url2))
+    if cached:
+        logger.info(f"Serving cached comparison: {url1} vs {url2}")
+        return cached_json_response(cached)
+
     logger.info(f"Comparing: {url1} vs {url2}")
     
-    result1 = scrape_features(url1)
-    result2 = scrape_features(url2)
+    (result1, hash1), (result2, hash2) = scrape_page(url1), scrape_page(url2)
 
     # Check for errors
     errors = {}
@@ -325,27 +509,110 @@ def compare():
     if errors:
         return jsonify({'error': errors}), 400
 
-    return jsonify({
-        'data1': normalize_features(result1),
-        'data2': normalize_features(result2)
+    data1, data2 = normalize_features(result1), normalize_features(result2)
+    record_history(url1, data1, hash1)
+    record_history(url2, data2, hash2)
+
+    entry = cache_put((url1, url2), {
+        'data1': data1,
+        'data2': data2
     })
+    return cached_json_response(entry)
+
+def record_history(url, data, content_hash):
+    # Only tracked URLs are kept, so ad-hoc comparisons don't grow the store
+    try:
+        store = get_history_store()
+        if store.is_tracked(url):
+            store.record(url, data, content_hash)
+    except Exception as e:
+        logger.error(f"Failed to record history for {url}: {e}")
+
+@api.route('/track', methods=['POST'])
+def track():
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'Missing JSON payload'}), 400
+
+    url = data.get('url')
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    if not is_valid_url(url):
+        return jsonify({'error': 'URL must start with http:// or https://'}), 400
+
+    if data.get('untrack'):
+        return jsonify({'url': url, 'tracked': False, 'removed': get_history_store().untrack(url)})
+
+    try:
+        interval = int(data.get('interval', DEFAULT_INTERVAL))
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({'error': 'interval must be a number of seconds'}), 400
+
+    interval = get_history_store().track(url, interval)
+    return jsonify({'url': url, 'tracked': True, 'interval': interval})
+
+@api.route('/history', methods=['GET'])
+def history():
+    url = request.args.get('url')
+    if not url:
+        return jsonify({'tracked': get_history_store().tracked()})
 
-@app.route('/health', methods=['GET'])
+    since = request.args.get('since', type=float)
+    limit = max(1, min(request.args.get('limit', 500, type=int), 5000))
+
+    return jsonify({'url': url, 'series': get_history_store().series(url, since=since, limit=limit)})
+
+@api.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'message': 'API is running'})
 
-@app.route('/', methods=['GET'])
+@api.route('/', methods=['GET'])
 def home():
     return jsonify({
         'name': 'Universal Feature Comparator API',
         'version': '1.2.0',
         'endpoints': {
-            '/compare': 'POST - Compare features from two URLs',
+            '/compare': 'GET/POST - Compare features from two URLs',
+            '/track': 'POST - Track a URL for periodic re-scraping',
+            '/history': 'GET - Price/feature history of a tracked URL',
             '/health': 'GET - Health check'
         },
         'note': 'Some websites (Amazon, Flipkart) use anti-bot protection and may not always work.'
     })
 
+def create_app(prewarm=None):
+    """Application factory.
+
+    Use as ``PREWARM=1 gunicorn -c gunicorn.conf.py --preload 'app:create_app()'``
+    to do the warm-up once in the master and share it with every worker;
+    the config's post_fork hook then pre-connects each worker.
+    """
+    if prewarm is None:
+        prewarm = os.environ.get('PREWARM', '0') == '1'
+
+    app = Flask(__name__)
+    app.config['PREWARM'] = prewarm
+    CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
+
+    history_store = HistoryStore()
+    app.extensions['history_store'] = history_store
+    app.extensions['rescrape_scheduler'] = RescrapeScheduler(history_store, scrape_normalized)
+    app.extensions['compare_cache'] = CompareCache()
+    app.register_blueprint(api)
+
+    if prewarm:
+        warm_up()
+    return app
+
+def __getattr__(name):
+    # 'gunicorn app:app' still works, but the app is only built on first
+    # access so the create_app() factory path builds exactly one.
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # if __name__ == '__main__':
 #     print("=" * 50)
 #     print("Starting Flask server...")
@@ -0,0 +1,83 @@
+"""Import-time budget check for app.py.
+
+Fails (exit code 1) when importing app.py and building the app with
+create_app() in a fresh interpreter takes longer than the budget, or when
+either step eagerly pulls in modules that should only be loaded on first
+use or by warm_up().
+
+    python check_cold_start.py [--budget-ms 300] [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+LAZY_MODULES = ['requests', 'bs4', 'soupsieve', 'lxml']
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'ms': (created - started) * 1000,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+def measure(runs):
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            HISTORY_SCHEDULER='0',
+            PREWARM='0',
+        )
+        for run in range(runs):
+            # Fresh database files per run so create_app() always builds the schemas
+            env['HISTORY_DB_PATH'] = os.path.join(tmp, f'history-{run}.db')
+            env['COMPARE_CACHE_PATH'] = os.path.join(tmp, f'compare_cache-{run}.db')
+            out = subprocess.run(
+                [sys.executable, '-c', PROBE],
+                cwd=here, env=env, capture_output=True, text=True, check=True
+            ).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    # About 2x the measured import + create_app() baseline (~140 ms)
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.environ.get('COLD_START_BUDGET_MS', 300)))
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    # The fastest run is the least affected by noise from the rest of the machine
+    fastest = min(results, key=lambda result: result['ms'])
+    best = fastest['ms']
+    loaded = sorted({name for result in results for name in result['loaded']})
+
+    print(f"import app + create_app(): best {best:.0f} ms over {args.runs} runs "
+          f"(import {fastest['import_ms']:.0f} ms, create_app {fastest['create_app_ms']:.0f} ms; "
+          f"budget {args.budget_ms:.0f} ms)")
+    failed = False
+    if best > args.budget_ms:
+        print(f"FAIL: cold start exceeds budget by {best - args.budget_ms:.0f} ms")
+        failed = True
+    if loaded:
+        print(f"FAIL: modules imported eagerly: {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
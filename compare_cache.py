@@ -0,0 +1,57 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+COMPARE_CACHE_PATH = os.environ.get('COMPARE_CACHE_PATH', 'compare_cache.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS compare_cache (
+    url1 TEXT NOT NULL,
+    url2 TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    body BLOB NOT NULL,
+    gzipped BLOB,
+    created REAL NOT NULL,
+    PRIMARY KEY (url1, url2)
+);
+"""
+
+class CompareCache:
+    """SQLite cache of /compare responses shared by every worker process"""
+
+    def __init__(self, path=COMPARE_CACHE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            # WAL is persistent, so it only needs setting once per file
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, url1, url2, ttl):
+        """Return a cached comparison younger than ttl seconds, or None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT etag, body, gzipped, created FROM compare_cache '
+                'WHERE url1 = ? AND url2 = ? AND created > ?',
+                (url1, url2, time.time() - ttl)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def put(self, url1, url2, entry, ttl):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM compare_cache WHERE created <= ?', (time.time() - ttl,))
+            conn.execute(
+                'INSERT OR REPLACE INTO compare_cache (url1, url2, etag, body, gzipped, created) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (url1, url2, entry['etag'], entry['body'], entry['gzipped'], entry['created'])
+            )
@@ -0,0 +1,8 @@
+import os
+
+def post_fork(server, worker):
+    # Open pooled connections to known hosts before this worker takes its
+    # first request; sockets opened before the fork can't be shared.
+    if os.environ.get('PREWARM', '0') == '1':
+        import app
+        app.preconnect_worker()
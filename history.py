@@ -0,0 +1,279 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DB_PATH = os.environ.get('HISTORY_DB_PATH', 'price_history.db')
+DEFAULT_INTERVAL = int(os.environ.get('HISTORY_DEFAULT_INTERVAL', 6 * 60 * 60))
+MIN_INTERVAL = 5 * 60
+MAX_INTERVAL = 365 * 24 * 60 * 60
+# Minimum gap between two scheduled scrapes hitting the same host
+HOST_MIN_GAP = float(os.environ.get('HISTORY_HOST_MIN_GAP', 30))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracked (
+    url TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    interval INTEGER NOT NULL,
+    next_due REAL NOT NULL,
+    added_at REAL NOT NULL,
+    content_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    last_hit REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    scraped_at REAL NOT NULL,
+    content_hash TEXT,
+    fields_hash TEXT NOT NULL,
+    product TEXT,
+    price TEXT,
+    price_value REAL,
+    fields TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_url_time ON history (url, scraped_at);
+"""
+
+def host_of(url):
+    return urlparse(url).netloc.lower()
+
+def parse_price(price_text):
+    """Best-effort conversion of a scraped price string to a number"""
+    if not price_text:
+        return None
+    match = re.search(r'\d[\d,]*(?:\.\d+)?', price_text)
+    if not match:
+        return None
+    try:
+        return float(match.group(0).replace(',', ''))
+    except ValueError:
+        return None
+
+def hash_fields(fields):
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+class HistoryStore:
+    """Append-only SQLite store of scraped product snapshots"""
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        with self._connect() as conn:
+            # WAL is persistent, so it only needs setting once per file
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps the store safe to share
+        # between request threads, the scheduler thread and forked workers.
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, url, fields, content_hash=None, scraped_at=None):
+        """Append a snapshot unless its fields match the latest one for this URL.
+
+        Retail pages differ on every fetch (tokens, ads), so the content hash
+        is kept as metadata only. Returns True when a new row was written.
+        """
+        fields_hash = hash_fields(fields)
+        scraped_at = scraped_at or time.time()
+        with self._connect() as conn:
+            # Take the write lock up front so concurrent recorders can't both
+            # read the same latest row and both insert
+            conn.execute('BEGIN IMMEDIATE')
+            if content_hash is not None:
+                conn.execute('UPDATE tracked SET content_hash = ? WHERE url = ?', (content_hash, url))
+            last = conn.execute(
+                'SELECT fields_hash FROM history WHERE url = ? '
+                'ORDER BY scraped_at DESC, id DESC LIMIT 1',
+                (url,)
+            ).fetchone()
+            if last and last['fields_hash'] == fields_hash:
+                return False
+            price = fields.get('Price')
+            conn.execute(
+                'INSERT INTO history (url, scraped_at, content_hash, fields_hash, '
+                'product, price, price_value, fields) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, scraped_at, content_hash, fields_hash, fields.get('Product'),
+                 price, parse_price(price), json.dumps(fields))
+            )
+        return True
+
+    def series(self, url, since=None, limit=500):
+        query = 'SELECT scraped_at, product, price, price_value, fields FROM history WHERE url = ?'
+        params = [url]
+        if since is not None:
+            query += ' AND scraped_at >= ?'
+            params.append(since)
+        query += ' ORDER BY scraped_at DESC, id DESC LIMIT ?'
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            {
+                'scraped_at': row['scraped_at'],
+                'product': row['product'],
+                'price': row['price'],
+                'price_value': row['price_value'],
+                'fields': json.loads(row['fields']),
+            }
+            for row in reversed(rows)
+        ]
+
+    def track(self, url, interval=DEFAULT_INTERVAL):
+        interval = min(max(int(interval), MIN_INTERVAL), MAX_INTERVAL)
+        now = time.time()
+        # Spread first re-scrapes over the interval instead of bunching them up
+        next_due = now + random.uniform(0, interval)
+        with self._connect() as conn:
+            # A shorter interval must not wait out the remainder of the old one
+            conn.execute(
+                'INSERT INTO tracked (url, host, interval, next_due, added_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(url) DO UPDATE SET '
+                'next_due = CASE WHEN excluded.interval < tracked.interval '
+                'THEN MIN(tracked.next_due, excluded.next_due) ELSE tracked.next_due END, '
+                'interval = excluded.interval',
+                (url, host_of(url), interval, next_due, now)
+            )
+        return interval
+
+    def is_tracked(self, url):
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM tracked WHERE url = ?', (url,)).fetchone() is not None
+
+    def last_content_hash(self, url):
+        with self._connect() as conn:
+            row = conn.execute('SELECT content_hash FROM tracked WHERE url = ?', (url,)).fetchone()
+        return row['content_hash'] if row else None
+
+    def untrack(self, url):
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM tracked WHERE url = ?', (url,)).rowcount > 0
+
+    def tracked(self):
+        with self._connect() as conn:
+            rows = conn.execute('SELECT url, interval, next_due FROM tracked ORDER BY url').fetchall()
+        return [dict(row) for row in rows]
+
+    def claim_due(self, now, host_min_gap=HOST_MIN_GAP):
+        """Claim due URLs whose host was not hit within host_min_gap seconds.
+
+        Claiming runs in one write transaction and records the host's last
+        hit in the same file, so schedulers in several workers share both
+        the claims and the per-host spacing.
+        """
+        claimed = []
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(
+                'SELECT t.url, t.host, t.interval FROM tracked t '
+                'LEFT JOIN hosts h ON h.host = t.host '
+                'WHERE t.next_due <= ? AND (h.last_hit IS NULL OR h.last_hit <= ?) '
+                'ORDER BY t.next_due',
+                (now, now - host_min_gap)
+            ).fetchall()
+            for row in rows:
+                hit = conn.execute(
+                    'INSERT INTO hosts (host, last_hit) VALUES (?, ?) '
+                    'ON CONFLICT(host) DO UPDATE SET last_hit = excluded.last_hit '
+                    'WHERE hosts.last_hit <= ?',
+                    (row['host'], now, now - host_min_gap)
+                ).rowcount
+                if not hit:
+                    continue
+                jitter = random.uniform(0, row['interval'] * 0.1)
+                conn.execute(
+                    'UPDATE tracked SET next_due = ? WHERE url = ?',
+                    (now + row['interval'] + jitter, row['url'])
+                )
+                claimed.append(row['url'])
+        return claimed
+
+    def next_claimable(self, host_min_gap=HOST_MIN_GAP):
+        """Earliest time a tracked URL is both due and clear of its host gap"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT MIN(MAX(t.next_due, COALESCE(h.last_hit + ?, 0))) AS due '
+                'FROM tracked t LEFT JOIN hosts h ON h.host = t.host',
+                (host_min_gap,)
+            ).fetchone()
+        return row['due']
+
+class RescrapeScheduler:
+    """Background thread that re-scrapes tracked URLs into a HistoryStore"""
+
+    def __init__(self, store, scrape, poll_interval=60, host_min_gap=HOST_MIN_GAP):
+        self.store = store
+        # scrape(url, unchanged_hash) -> (features, content_hash); features
+        # carry 'error' on failure and are None when the page hash is unchanged
+        self.scrape = scrape
+        self.poll_interval = poll_interval
+        self.host_min_gap = host_min_gap
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='rescrape-scheduler', daemon=True)
+            self._thread.start()
+        logger.info("Re-scrape scheduler started")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run_once(self, now=None):
+        now = now or time.time()
+        written = 0
+        # Read-only check first so idle passes don't take the write lock
+        due = self.store.next_claimable(self.host_min_gap)
+        if due is None or due > now:
+            return written
+        for url in self.store.claim_due(now, self.host_min_gap):
+            try:
+                features, content_hash = self.scrape(url, self.store.last_content_hash(url))
+            except Exception as e:
+                logger.error(f"Scheduled scrape failed for {url}: {e}")
+                continue
+            if features is None:
+                logger.debug(f"Page unchanged since last scrape: {url}")
+                continue
+            if 'error' in features:
+                logger.warning(f"Scheduled scrape error for {url}: {features['error']}")
+                continue
+            if self.store.record(url, features, content_hash):
+                written += 1
+        return written
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                due = self.store.next_claimable(self.host_min_gap)
+            except Exception as e:
+                logger.error(f"Re-scrape scheduler error: {e}")
+                due = None
+            wait = self.poll_interval if due is None else min(max(due - time.time(), 1), self.poll_interval)
+            self._stop.wait(wait)
@@ -0,0 +1,430 @@
+"""Load-test harness for the comparator API.
+
+Drives /health (baseline) and /compare against a local stand-in origin that
+serves recorded product pages with configurable latency and failure rate,
+then reports throughput, latency percentiles, errors and worker CPU/RSS.
+
+    # spawn gunicorn, 20 concurrent clients for 30s per endpoint
+    python loadtest.py --spawn "gunicorn -w 4 -b 127.0.0.1:8000 app:app" --concurrency 20
+
+    # repeat views of 10 URL pairs: measures cache hits, 304s and gzip
+    python loadtest.py --spawn "gunicorn -w 4 -b 127.0.0.1:8000 app:app" --repeat-views 10
+
+    # open-loop at 5 req/s against an already running server
+    python loadtest.py --target http://127.0.0.1:8000 --pid 1234 --rate 5 --out run.json
+
+Recorded pages are read from --pages (one HTML file per page); a built-in
+sample page is used when none are given. Linux only for CPU/RSS sampling.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import shlex
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_PAGE = b"""<html><head><title>Sample Phone</title>
+<meta name="description" content="A recorded product page used for load testing."></head>
+<body><h1>Sample Phone 128GB</h1>
+<div class="price">Rs. 19,999</div>
+<div class="product-description">6.5 inch display, 5000 mAh battery, dual camera.</div>
+<ul><li>128 GB internal storage</li><li>8 GB RAM for multitasking</li><li>50 MP main rear camera</li></ul>
+</body></html>"""
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def load_pages(path):
+    if not path:
+        return [SAMPLE_PAGE]
+    pages = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith(('.html', '.htm')):
+            with open(os.path.join(path, name), 'rb') as f:
+                pages.append(f.read())
+    if not pages:
+        raise SystemExit(f"No .html files found in {path}")
+    return pages
+
+def start_origin(pages, delay_ms, jitter_ms, failure_rate, port=0):
+    """Serve recorded pages on 127.0.0.1 with injected latency and 5xx failures"""
+
+    class OriginHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            delay = max(0.0, delay_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000
+            time.sleep(delay)
+            if random.random() < failure_rate:
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            # /page/<n>?... picks a recorded page, anything else gets a random one
+            parts = self.path.split('?')[0].strip('/').split('/')
+            try:
+                page = pages[int(parts[1]) % len(pages)]
+            except (IndexError, ValueError):
+                page = random.choice(pages)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), OriginHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='origin', daemon=True).start()
+    return server
+
+def _read_proc(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        # The command name may contain spaces, so split after its closing paren
+        fields = f.read().rsplit(')', 1)[1].split()
+    ppid, utime, stime = int(fields[1]), int(fields[11]), int(fields[12])
+    with open(f'/proc/{pid}/statm') as f:
+        rss = int(f.read().split()[1]) * PAGE_SIZE
+    return ppid, (utime + stime) / CLOCK_TICKS, rss
+
+def process_tree(root_pid):
+    pids = [root_pid]
+    for entry in os.listdir('/proc'):
+        if entry.isdigit() and int(entry) != root_pid:
+            try:
+                if _read_proc(int(entry))[0] == root_pid:
+                    pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    return pids
+
+class ResourceSampler:
+    """Samples CPU% and RSS of a server process and its workers over time"""
+
+    def __init__(self, pid, interval=1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampler', daemon=True)
+
+    def start(self):
+        if self.pid and os.path.isdir('/proc'):
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        return self.samples
+
+    def _run(self):
+        started = time.monotonic()
+        last = {}
+        while not self._stop.is_set():
+            now = time.monotonic()
+            processes = {}
+            for pid in process_tree(self.pid):
+                try:
+                    _, cpu, rss = _read_proc(pid)
+                except (OSError, IndexError, ValueError):
+                    continue
+                previous = last.get(pid)
+                cpu_percent = None
+                if previous:
+                    cpu_percent = round(100 * (cpu - previous[1]) / (now - previous[0]), 1)
+                last[pid] = (now, cpu)
+                processes[pid] = {'cpu_percent': cpu_percent, 'rss_mb': round(rss / 2 ** 20, 1)}
+            self.samples.append({
+                't': round(now - started, 2),
+                'cpu_percent': round(sum(p['cpu_percent'] or 0 for p in processes.values()), 1),
+                'rss_mb': round(sum(p['rss_mb'] for p in processes.values()), 1),
+                'processes': processes,
+            })
+            self._stop.wait(self.interval)
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank definition
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+# Substrings of the API's error messages, mapped to a cause for the report
+ERROR_KINDS = [
+    ('(503)', 'origin_503'),
+    ('(403)', 'origin_403'),
+    ('HTTP error', 'origin_http_error'),
+    ('timeout', 'origin_timeout'),
+    ('Failed to fetch', 'origin_unreachable'),
+    ('Error processing', 'scrape_error'),
+    ('required', 'bad_request'),
+    ('must start with', 'bad_request'),
+    ('Missing', 'bad_request'),
+]
+
+def classify_error(status, body):
+    """Label an error response by the cause in its 'error' body, e.g. '400 origin_503'"""
+    try:
+        error = json.loads(body).get('error')
+    except (ValueError, AttributeError):
+        return str(status)
+    messages = list(error.values()) if isinstance(error, dict) else [error]
+    kinds = sorted({
+        next((kind for needle, kind in ERROR_KINDS if needle in str(message)), 'other')
+        for message in messages
+    })
+    return f"{status} {'+'.join(kinds)}"
+
+def send(method, url, body=None, timeout=60, headers=None):
+    """Issue one request and return (status or error label, bytes received, response headers)"""
+    headers = dict(headers or {})
+    if body is not None:
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(url, data=body, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, len(response.read()), response.headers
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return 304, 0, e.headers
+        error_body = e.read() or b''
+        return classify_error(e.code, error_body), len(error_body), e.headers
+    except urllib.error.URLError as e:
+        return type(e.reason).__name__, 0, {}
+    except Exception as e:
+        return type(e).__name__, 0, {}
+
+def make_request(endpoint, target, origin, pages, counter, method='GET', repeat_views=0):
+    """Return (method, url, body, key); key identifies the URL pair for revalidation"""
+    if endpoint == 'health':
+        return 'GET', f'{target}/health', None, None
+    n = next(counter)
+    if repeat_views:
+        # Cycle through a fixed set of pairs so repeat views hit the API's cache
+        n %= repeat_views
+        url1 = f'{origin}/page/{n % len(pages)}?pair={n}a'
+        url2 = f'{origin}/page/{(n + 1) % len(pages)}?pair={n}b'
+    else:
+        # Unique query strings keep the API's result cache from short-circuiting scrapes
+        url1 = f'{origin}/page/{n % len(pages)}?n={n}a'
+        url2 = f'{origin}/page/{(n + 1) % len(pages)}?n={n}b'
+    if method == 'GET':
+        # GET matches how the frontend calls /compare
+        return 'GET', f'{target}/compare?{urllib.parse.urlencode({"url1": url1, "url2": url2})}', None, n
+    return 'POST', f'{target}/compare', json.dumps({'url1': url1, 'url2': url2}).encode('utf-8'), n
+
+def run_phase(endpoint, args, origin, pages):
+    counter = itertools.count()
+    counter_lock = threading.Lock()
+    results = []
+    results_lock = threading.Lock()
+    etags = {}
+    repeat_views = args.repeat_views if endpoint == 'compare' else 0
+    deadline = time.monotonic() + args.duration
+
+    def next_request():
+        with counter_lock:
+            return make_request(endpoint, args.target, origin, pages, counter, args.method, repeat_views)
+
+    def one(scheduled):
+        method, url, body, key = next_request()
+        headers = {}
+        if repeat_views:
+            # Behave like a browser revisiting the page: accept gzip and
+            # revalidate with the ETag from the previous view of this pair
+            headers['Accept-Encoding'] = 'gzip'
+            with results_lock:
+                if key in etags:
+                    headers['If-None-Match'] = etags[key]
+        status, size, response_headers = send(method, url, body, timeout=args.timeout, headers=headers)
+        # Latency is measured from the intended start so queueing delay in
+        # open-loop mode is not hidden (coordinated omission)
+        latency = time.monotonic() - scheduled
+        gzipped = response_headers.get('Content-Encoding') == 'gzip'
+        with results_lock:
+            if repeat_views and status == 200 and response_headers.get('ETag'):
+                etags[key] = response_headers['ETag']
+            results.append((latency, status, size, gzipped))
+
+    def closed_loop_client():
+        while time.monotonic() < deadline:
+            one(time.monotonic())
+
+    sampler = ResourceSampler(args.pid, args.sample_interval).start()
+    started = time.monotonic()
+    if args.rate:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            scheduled = started
+            while scheduled < deadline:
+                # Poisson arrivals at the requested mean rate
+                scheduled += random.expovariate(args.rate)
+                time.sleep(max(0.0, scheduled - time.monotonic()))
+                pool.submit(one, scheduled)
+    else:
+        clients = [threading.Thread(target=closed_loop_client, daemon=True) for _ in range(args.concurrency)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+    elapsed = time.monotonic() - started
+    samples = sampler.stop()
+
+    latencies = sorted(latency for latency, status, _, _ in results if status in (200, 304))
+    outcomes = Counter(str(status) for _, status, _, _ in results)
+    errors = {status: count for status, count in outcomes.items() if status not in ('200', '304')}
+    cpu = [s['cpu_percent'] for s in samples[1:]]
+    rss = [s['rss_mb'] for s in samples]
+    return {
+        'endpoint': endpoint,
+        'mode': 'open' if args.rate else 'closed',
+        'method': 'GET' if endpoint == 'health' else args.method,
+        'duration_s': round(elapsed, 2),
+        'requests': len(results),
+        'ok': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'latency_ms': {
+            name: round(value * 1000, 1) if value is not None else None
+            for name, value in (
+                ('p50', percentile(latencies, 50)),
+                ('p95', percentile(latencies, 95)),
+                ('p99', percentile(latencies, 99)),
+                ('max', latencies[-1] if latencies else None),
+                ('mean', sum(latencies) / len(latencies) if latencies else None),
+            )
+        },
+        'responses': {
+            '200': outcomes.get('200', 0),
+            '304': outcomes.get('304', 0),
+            'gzip': sum(1 for _, status, _, gzipped in results if status == 200 and gzipped),
+            'bytes_received': sum(size for _, _, size, _ in results),
+        },
+        'errors': errors,
+        'resources': {
+            'cpu_percent_mean': round(sum(cpu) / len(cpu), 1) if cpu else None,
+            'cpu_percent_max': max(cpu) if cpu else None,
+            'rss_mb_max': max(rss) if rss else None,
+            'samples': samples,
+        },
+    }
+
+def wait_until_healthy(target, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if send('GET', f'{target}/health', timeout=2)[0] == 200:
+            return True
+        time.sleep(0.25)
+    return False
+
+def print_summary(phase):
+    latency = phase['latency_ms']
+    resources = phase['resources']
+    print(f"\n/{phase['endpoint']} ({phase['mode']} loop, {phase['duration_s']}s)")
+    print(f"  requests {phase['requests']}  ok {phase['ok']}  throughput {phase['throughput_rps']} req/s")
+    print(f"  latency ms  p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    responses = phase['responses']
+    print(f"  responses 200: {responses['200']}  304: {responses['304']}  gzip: {responses['gzip']}"
+          f"  received {responses['bytes_received']} bytes")
+    if phase['errors']:
+        print(f"  errors {', '.join(f'{k}: {v}' for k, v in sorted(phase['errors'].items()))}")
+    if resources['samples']:
+        print(f"  server cpu mean {resources['cpu_percent_mean']}%  max {resources['cpu_percent_max']}%"
+              f"  rss max {resources['rss_mb_max']} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test /health and /compare')
+    parser.add_argument('--target', default='http://127.0.0.1:8000', help='API base URL')
+    parser.add_argument('--spawn', help='command that starts the API server, e.g. "gunicorn -w 4 app:app"')
+    parser.add_argument('--pid', type=int, help='PID of an already running server (master) to sample')
+    parser.add_argument('--endpoints', default='health,compare', help='comma-separated phases to run')
+    parser.add_argument('--method', choices=['GET', 'POST'], default='GET',
+                        help='how /compare is called; GET matches the frontend')
+    parser.add_argument('--repeat-views', type=int, default=0, metavar='PAIRS',
+                        help='cycle /compare over PAIRS URL pairs, sending Accept-Encoding: gzip and '
+                             'If-None-Match to measure cache hits, 304s and compression')
+    parser.add_argument('--concurrency', type=int, default=10, help='clients (closed loop) or max in flight (open loop)')
+    parser.add_argument('--rate', type=float, help='open-loop arrival rate in req/s (default: closed loop)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per phase')
+    parser.add_argument('--timeout', type=float, default=60, help='per-request timeout in seconds')
+    parser.add_argument('--pages', help='directory of recorded .html pages for the stand-in origin')
+    parser.add_argument('--origin-port', type=int, default=0)
+    parser.add_argument('--origin-delay-ms', type=float, default=200)
+    parser.add_argument('--origin-jitter-ms', type=float, default=50)
+    parser.add_argument('--origin-failure-rate', type=float, default=0.0)
+    parser.add_argument('--sample-interval', type=float, default=1.0, help='seconds between CPU/RSS samples')
+    parser.add_argument('--label', help='free-form name stored in the report to tell runs apart')
+    parser.add_argument('--out', help='write the JSON report to this file')
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    origin_server = start_origin(pages, args.origin_delay_ms, args.origin_jitter_ms,
+                                 args.origin_failure_rate, args.origin_port)
+    origin = f'http://127.0.0.1:{origin_server.server_address[1]}'
+
+    server = None
+    tmp = tempfile.TemporaryDirectory()
+    if args.spawn:
+        env = dict(
+            os.environ,
+            HISTORY_SCHEDULER='0',
+            HISTORY_DB_PATH=os.path.join(tmp.name, 'history.db'),
+            COMPARE_CACHE_PATH=os.path.join(tmp.name, 'compare_cache.db'),
+        )
+        if not args.repeat_views:
+            # Without repeat views every /compare should really scrape
+            env['COMPARE_CACHE_TTL'] = '0'
+        server = subprocess.Popen(shlex.split(args.spawn), env=env,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+        args.pid = args.pid or server.pid
+
+    try:
+        if not wait_until_healthy(args.target):
+            raise SystemExit(f"API at {args.target} did not become healthy")
+
+        report = {
+            'label': args.label,
+            'started_at': time.time(),
+            'config': {
+                key: value for key, value in vars(args).items()
+                if key not in ('out', 'label')
+            },
+            'origin': {'pages': len(pages), 'url': origin},
+            'phases': [],
+        }
+        for endpoint in [e.strip() for e in args.endpoints.split(',') if e.strip()]:
+            if endpoint not in ('health', 'compare'):
+                raise SystemExit(f"Unknown endpoint {endpoint!r}")
+            phase = run_phase(endpoint, args, origin, pages)
+            report['phases'].append(phase)
+            print_summary(phase)
+    finally:
+        if server:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        origin_server.shutdown()
+        tmp.cleanup()
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.out}")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -50,11 +50,9 @@ form.addEventListener('submit', async (e) => {
     tableBody.innerHTML = '';
 
     try {
-        const response = await fetch(`${API_BASE_URL}/compare`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url1, url2 })
-        });
+        // GET lets the browser cache and revalidate repeat comparisons via ETag
+        const params = new URLSearchParams({ url1, url2 });
+        const response = await fetch(`${API_BASE_URL}/compare?${params}`);
 
         const data = await response.json();
 